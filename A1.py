@@ -1,5 +1,9 @@
+import functools
+import multiprocessing
 import os
-from typing import Union, List, Optional
+import re
+import sys
+from typing import Callable, Dict, Union, List, Literal, Optional, Sequence, Tuple
 
 alphabet_chars = list("abcdefghijklmnopqrstuvwxyz") + list("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
 numeric_chars = list("0123456789")
@@ -9,6 +13,72 @@ valid_examples_fp = "./valid_examples.txt"
 invalid_examples_fp = "./invalid_examples.txt"
 extra_valid_examples_fp = "./extra_valid_examples.txt"
 extra_invalid_examples_fp = "./extra_invalid_examples.txt"
+_PARALLEL_MIN_LINES = 10000  # files with fewer lines are parsed without worker processes
+
+# parse tree indents by level, deeper levels fall back to building the string
+_INDENTS = tuple('----' * level for level in range(256))
+
+# adds association brackets to a list of tokens, see get_associator()
+Associator = Callable[[List[str]], List[str]]
+
+# tokens (or False) and error messages of a parsed line, immutable so that stored results can be shared
+ParseResult = Tuple[Union[Tuple[str, ...], Literal[False]], Tuple[str, ...]]
+
+# character class lookup table, indexed by the latin-1 code of a character
+# parse_tokens_rec dispatches on these classes to pick the case for the next token
+_ALPHA = 1
+_DIGIT = 2
+_VAR = _ALPHA | _DIGIT
+_SPACE = 4
+_DOT = 8
+_BSLASH = 16
+_LPAREN = 32
+_CHARCLASS = bytearray(256)
+for c in alphabet_chars:
+  _CHARCLASS[ord(c)] = _ALPHA
+for c in numeric_chars:
+  _CHARCLASS[ord(c)] |= _DIGIT
+_CHARCLASS[ord(" ")] = _SPACE
+_CHARCLASS[ord(".")] = _DOT
+_CHARCLASS[ord("\\")] = _BSLASH
+_CHARCLASS[ord("(")] = _LPAREN
+
+# translation table removing all characters of the grammar from a string
+_DELETE_VALID_CHARS = str.maketrans("", "", "".join(all_valid_chars) + " ")
+
+# runs of characters matched in C by the scanner, once they are longer than _SHORT_RUN
+_SHORT_RUN = 8
+_VAR_RUN = re.compile(r"[A-Za-z0-9]+")
+_VAR_SPACE_RUN = re.compile(r"[A-Za-z0-9 ]+")
+_BRACKETS = re.compile(r"[()]")
+
+
+def _char_classes(s: str) -> bytes:
+  """
+  :param s: Input string
+  :return: The character class flags of each character in s, one byte per character.
+  Characters outside latin-1 are mapped to class 0 (no flags).
+  """
+
+  return s.encode("latin-1", "replace").translate(_CHARCLASS)
+
+
+def _match_brackets(s: str) -> List[int]:
+  """
+  :param s: Input string
+  :return: For each opening bracket in s, the index of its closing bracket, or -1 if it is never closed.
+  -1 for all other characters.
+  """
+
+  match = [-1] * len(s)
+  open_brackets: List[int] = []
+  for bracket in _BRACKETS.finditer(s):
+    i = bracket.start()
+    if s[i] == "(":
+      open_brackets.append(i)
+    elif open_brackets:
+      match[open_brackets.pop()] = i
+  return match
 
 
 def read_lines_from_txt(fp: Union[str, os.PathLike]) -> List[str]:
@@ -19,12 +89,14 @@ def read_lines_from_txt(fp: Union[str, os.PathLike]) -> List[str]:
   """
 
   with open(fp, "r") as f:
-    raw_lines = f.readlines()
-
-    # remove whitespaces for each line
-    lines = [line.strip() for line in raw_lines]
+    # read the file in one go, newlines are already normalized to "\n" in text mode
+    raw_lines = f.read().split("\n")
+  # like readlines(), a final newline does not start another line
+  if raw_lines[-1] == "":
+    raw_lines.pop()
 
-    return lines
+  # remove whitespaces for each line
+  return [line.strip() for line in raw_lines]
 
 
 def is_valid_var_name(s: str) -> bool:
@@ -34,14 +106,15 @@ def is_valid_var_name(s: str) -> bool:
   and contains only characters and digits. Returns False otherwise.
   """
 
+  classes = _char_classes(s)
+
   # check var name starts with character
-  if s[0] not in alphabet_chars:
-    print("")
+  if not classes[0] & _ALPHA:
     return False
 
   # check rest of var name is only characters and digits
-  for x in s[1:]:
-    if x not in var_chars:
+  for x in classes[1:]:
+    if not x & _VAR:
       return False
 
   # passed all validity tests
@@ -56,9 +129,11 @@ class Node:
       children: a list of child nodes
   """
 
-  def __init__(self, elem: List[str] = None):
-    self.elem = elem
-    self.children = []
+  __slots__ = ('elem', 'children')
+
+  def __init__(self, elem: Optional[List[str]] = None):
+    self.elem: List[str] = elem if elem is not None else []
+    self.children: List['Node'] = []
 
   def add_child_node(self, node: 'Node') -> None:
     self.children.append(node)
@@ -71,7 +146,7 @@ class ParseTree:
       root: the root of the tree
   """
 
-  def __init__(self, root):
+  def __init__(self, root: Node):
     self.root = root
 
   def print_tree(self, node: Optional[Node] = None, level: int = 0) -> None:
@@ -80,195 +155,293 @@ class ParseTree:
     # start with root node
     if node is None:
       node = self.root
-    # current node
-    indent = '----' * level
-    # print full tree elem as shown in example
-    for token in node.elem:
-      print(indent + token)
-    # recursive call to print child nodes
-    for child in node.children:
-      # increase level of indent and tree
-      self.print_tree(child, level + 1)
-
-
-def parse_tokens_rec(s_: str, original: str, pos: int, association_type: Optional[str] = None) -> Union[List[str], bool]:
+    lines: List[str] = []
+    # depth-first traversal with an explicit stack, children pushed in reverse to keep their order
+    stack = [(node, level)]
+    while stack:
+      node, level = stack.pop()
+      # current node
+      indent = _INDENTS[level] if level < len(_INDENTS) else '----' * level
+      # print full tree elem as shown in example
+      for token in node.elem:
+        lines.append(indent + token)
+      stack.extend((child, level + 1) for child in reversed(node.children))
+    # write the whole tree at once instead of one print per line
+    if lines:
+      lines.append("")
+      sys.stdout.write("\n".join(lines))
+
+
+def parse_tokens_rec(s: str, classes: bytes, match: List[int], start: int, end: int, pos: int,
+                     associate: Optional[Associator], tokens: List[str],
+                     errors: Optional[List[str]]) -> Tuple[bool, bool]:
   """
   Recursive function to accompany parse_tokens()
   Uses a top-down parsing approach to identify all tokens with necessary brackets
+  The span s[start:end] is scanned in place, recursing only into bracket and lambda bodies
+
+  :param s: the full input string, unmodified to display location of error
+  :param classes: character classes of s, as returned by _char_classes()
+  :param match: index of the matching closing bracket for each opening bracket in s,
+  as returned by _match_brackets()
+  :param start: index in s where the span to parse starts
+  :param end: index in s where the span to parse ends (exclusive)
+  :param pos: current position tracking through recursion to identify location of error
+  :param associate: If not None, the function adding brackets to make expressions non-ambiguous,
+  as returned by get_associator()
+  :param tokens: list the tokens (strings) of the span are appended to
+  :param errors: list the error message of an invalid input is appended to, if None no message is made
+  :return: A tuple of True if a valid input, otherwise False, and whether the tokens of the span
+  are a single bracket group covering all of them
+  """
+
+  # bind hot lookups to locals
+  app = tokens.append
+  ext = tokens.extend
+  var = _VAR
+  var_or_space = _VAR | _SPACE
+  var_run = _VAR_RUN.match
+  var_space_run = _VAR_SPACE_RUN.match
+  closing_brackets = 0  # brackets opened by case 3 that close at the end of the span
+  first_token = True  # next token is the first one of the span
+  grouped = False  # tokens of the span are a single bracket group
+
+  # remove trailing whitespaces, if any
+  while end > start and s[end - 1].isspace():
+    end -= 1
+
+  while True:
+    # case 1: blank space, skipped without moving pos (as the leading part of a stripped string)
+    while start < end and s[start].isspace():
+      start += 1
+    n = end - start  # length of the remaining span
+
+    # case 0: base case when span is blank
+    if n == 0:
+      break
+    kind = classes[start]  # character class of the next token's first character
+
+    # case 2: variables
+    if kind & _BSLASH:
+      app("\\")
+      end_index = 1
+      # names are mostly short, step through them and only match long ones with the regex
+      while end_index < n and classes[start + end_index] & var:
+        end_index += 1
+        if end_index == _SHORT_RUN:
+          run = var_run(s, start + end_index, end)
+          if run:
+            end_index = run.end() - start
+          break
+      if end_index == 1:
+        # ERROR
+        if errors is not None:
+          errors.append("Error in [" + s + "] at position " + str(pos + 2) + ": No valid variable name found.")
+        return False, False
+      if not classes[start + 1] & _ALPHA:
+        # ERROR
+        if errors is not None:
+          errors.append("Error in [" + s + "] at position " + str(pos + 2) + ": Variable must start with a character.")
+        return False, False
+      if end_index + 1 >= n:
+        # ERROR
+        if errors is not None:
+          errors.append("Error in [" + s + "] at position " + str(pos + 2) + ": No expression found after variable.")
+        return False, False
+      # the variable usually repeats in the lambda body, share one string for it
+      app(sys.intern(s[start + 1:start + end_index]))
+      # keep track of spaces between var and next character
+      spaces_len = 0
+      while end_index < n and classes[start + end_index] & _SPACE:
+        spaces_len += 1
+        end_index += 1
+      # check if dot expression exists
+      dot_expr = False
+      # dot operation detected
+      if classes[start + end_index] & _DOT:
+        # space exists between dot and variable
+        if spaces_len > 0:
+          # ERROR
+          if errors is not None:
+            errors.append(
+              "Error in [" + s + "] at position " + str(pos + end_index) +
+              ": No spaces allowed between variable and dot."
+            )
+          return False, False  # no spaces allowed before "." according to invalid examples
+        end_index += 1
+        dot_expr = True
+      # recursive call, the lambda body is the rest of the span
+      nested_start = len(tokens)
+      valid, nested_grouped = parse_tokens_rec(s, classes, match, start + end_index, end, pos + end_index,
+                                               associate, tokens, errors)
+      if not valid:
+        return False, False  # ERROR - message added further down in recursive calls
+      if nested_start == len(tokens):
+        return False, False
+      # subcase 2.1: dot operator, only expected after a variable
+      # do not add extra brackets from dot operator if the following bracket covers the entire string
+      add_extra_brackets = not nested_grouped
+      # RESOLVE AMBIGUITY: add extra brackets only if necessary for dot expressions
+      if dot_expr and add_extra_brackets:
+        tokens.insert(nested_start, "(")
+        app(")")
+      break
+      # END case
+
+    # case 3: brackets
+    if kind & _LPAREN:
+      # matching bracket from the table paired once per parse
+      close = match[start]
+      end_index = close + 1 - start if close != -1 else n  # end of the span if the bracket is never closed
+      if close == -1:
+        # ERROR
+        error_component = "EOL."
+        if end_index < n - 1:
+          error_component = s[start + end_index + 1] + "."
+        if errors is not None:
+          errors.append(
+            "Error in [" + s + "] at position " + str(pos + end_index) +
+            ": Expected closing parenthesis, found " + error_component
+          )
+        return False, False
+      if end_index <= 2:
+        # ERROR
+        if errors is not None:
+          errors.append(
+            "Error in [" + s + "] at position " + str(pos + 1) +
+            ": Missing tokens between brackets."
+          )
+        return False, False
+      # pre-subcase 3.1: bracket does not go up to the end of the span
+      wrapped = end_index + 1 < n and associate is not None
+      if wrapped:
+        app("(")
+        closing_brackets += 1
+      if first_token:
+        # either wrapped up to the end of the span, or nothing after the bracket
+        grouped = wrapped or end_index == n
+        first_token = False
+      # add tokens with brackets
+      app("(")
+      nested_start = len(tokens)
+      # recursive call
+      if not parse_tokens_rec(s, classes, match, start + 1, start + end_index - 1, pos + 1, associate, tokens, errors)[0]:
+        return False, False  # ERROR - message added further down in recursive calls
+      if len(tokens) == nested_start:
+        return False, False
+      app(")")
+      # subcase 3.1: more expression after bracket ends, continue with the rest of the span
+      start += end_index
+      pos += end_index
+      continue
+      # END case
+
+    # case 4: all other characters
+    if kind & var:
+      if not kind & _ALPHA:
+        # ERROR
+        if errors is not None:
+          errors.append("Error in [" + s + "] at position " + str(pos + 1) + ": Name must start with a character.")
+        return False, False
+      # find length of all characters that are tokens of the expression chain
+      end_index = 1
+      while end_index < n and classes[start + end_index] & var_or_space:
+        end_index += 1
+        if end_index == _SHORT_RUN:
+          run = var_space_run(s, start + end_index, end)
+          if run:
+            end_index = run.end() - start
+          break
+      # split into char tokens to add associativity optionally, otherwise extend tokens list directly
+      char_tokens = s[start:start + end_index].strip().split(" ")
+      if associate is not None:
+        # RESOLVE AMBIGUITY: add association
+        char_tokens = associate(char_tokens)
+      ext(char_tokens)
+      if first_token:
+        # associated chain with nothing after it
+        grouped = char_tokens[0] == "(" and end_index == n
+        first_token = False
+      # continue with the rest of the span
+      start += end_index
+      pos += end_index
+      continue
+      # END case
+
+    # case 5: anything else unknown
+    else:
+      # ERROR
+      if errors is not None:
+        errors.append("Error in [" + s + "] at position " + str(pos + 1) + ": Unexpected token '" + s[start] + "'")
+      return False, False
+      # END case
+
+  if closing_brackets:
+    ext([")"] * closing_brackets)
+  return True, grouped
+
+
+def parse_tokens_quiet(s_: str, association_type: Optional[str] = None, report: bool = True) \
+    -> Tuple[Union[List[str], Literal[False]], List[str]]:
+  """
+  Same as parse_tokens(), but collects the error message of an invalid input instead of printing it,
+  so that it can run in a worker process
 
   :param s_: the input string
-  :param original: original string unmodified to display location of error
-  :param pos: current position tracking through recursion to identify location of error
   :param association_type: If not None, add brackets to make expressions non-ambiguous
-  :return: A List of tokens (strings) if a valid input, otherwise False
+  :param report: If False, no error message is made, and inputs with characters that are not part
+  of the grammar are rejected without parsing them
+  :return: A tuple of the List of tokens (strings) if a valid input, otherwise False,
+  and the list of error messages
   """
+  tokens: List[str] = []
+  errors: List[str] = []
+  if not report:
+    # only whitespace may be left once the characters of the grammar are removed.
+    # Otherwise parsing is bound to fail, possibly on an earlier error, which is why
+    # this shortcut is only taken when the message is not reported
+    remaining = s_.translate(_DELETE_VALID_CHARS)
+    if remaining and not remaining.isspace():
+      return False, errors
+  associate = get_associator(association_type)
+  if not parse_tokens_rec(s_, _char_classes(s_), _match_brackets(s_), 0, len(s_), 0, associate, tokens, errors if report else None)[0]:
+    return False, errors
+  return tokens, errors
+
+
+def parse_tokens_frozen(s: str, association_type: Optional[str] = None, report: bool = True) -> ParseResult:
+  """
+  parse_tokens_quiet() with immutable results, so that they can be stored and shared between callers
 
-  s = s_[:]  # Don't modify the original input string
-
-  s = s.strip()  # remove trailing whitespaces, if any
-  tokens = []  # collect tokens
+  :param s: the input string
+  :param association_type: If not None, add brackets to make expressions non-ambiguous
+  :param report: If False, do not make error messages
+  :return: A tuple of the tokens (strings) if a valid input, otherwise False,
+  and the error messages
+  """
+  tokens, errors = parse_tokens_quiet(s, association_type, report)
+  if tokens is False:
+    return False, tuple(errors)
+  return tuple(tokens), tuple(errors)
 
-  # case 0: base case when string is blank
-  if len(s) == 0:
-    return []
 
-  # case 1: blank space
-  if s[0] == " ":
-    return parse_tokens_rec(s[1:], original, pos + 1, association_type)
-    # END case
+@functools.lru_cache(maxsize=1024)
+def parse_tokens_memo(s: str, association_type: Optional[str] = None, report: bool = True) -> ParseResult:
+  """
+  Memoized parse_tokens_frozen(), to accompany parse_tokens(memoize=True)
+  Keeps the results of the last 1024 distinct calls, parse_tokens_memo.cache_clear() frees them
 
-  # case 2: variables
-  if s[0] == "\\":
-    tokens.append(s[0])
-    end_index = 1
-    while end_index < len(s) and s[end_index] in var_chars:
-      end_index += 1
-    if end_index == 1:
-      # ERROR
-      print("Error in [" + original + "] at position " + str(pos + 2) + ": No valid variable name found.")
-      return False
-    if s[1] not in alphabet_chars:
-      # ERROR
-      print("Error in [" + original + "] at position " + str(pos + 2) + ": Variable must start with a character.")
-      return False
-    if end_index + 1 >= len(s):
-      # ERROR
-      print("Error in [" + original + "] at position " + str(pos + 2) + ": No expression found after variable.")
-      return False
-    tokens.append(s[1:end_index])
-    spaces_len = 0  # keep track of spaces between var and next character
-    while end_index < len(s) and s[end_index] == " ":
-      spaces_len += 1
-      end_index += 1
-    # check if dot expression exists
-    dot_expr = False
-    # dot operation detected
-    if s[end_index] == ".":
-      # space exists between dot and variable
-      if spaces_len > 0:
-        # ERROR
-        print(
-          "Error in [" + original + "] at position " + str(pos + end_index) +
-          ": No spaces allowed between variable and dot."
-        )
-        return False  # no spaces allowed before "." according to invalid examples
-      end_index += 1
-      dot_expr = True
-    # recursive call
-    nested_tokens = parse_tokens_rec(s[end_index:], original, pos + end_index, association_type)
-    if not nested_tokens:
-      return False  # ERROR - message returned further down in recursive calls
-    # subcase 2.1: dot operator, only expected after a variable
-    add_extra_brackets = True
-    # check if brackets already take care of grouping
-    if nested_tokens[0] == "(":
-      bracket_count = 1  # keep track of brackets
-      bracket_index = 1  # to check respective position to string length
-      while bracket_index < len(nested_tokens):
-        if nested_tokens[bracket_index] == "(":
-          bracket_count += 1
-        elif nested_tokens[bracket_index] == ")":
-          bracket_count -= 1
-        if bracket_count == 0:
-          # the first bracket being tracked is closed
-          break
-        bracket_index += 1
-      if bracket_index == len(nested_tokens) - 1:
-        # do not add extra brackets from dot operator if the following bracket covers the entire string
-        add_extra_brackets = False
-    # RESOLVE AMBIGUITY: add extra brackets only if necessary for dot expressions
-    if dot_expr and add_extra_brackets:
-      tokens.append("(")
-    # add collected tokens
-    tokens.extend(nested_tokens)
-    if dot_expr and add_extra_brackets:
-      tokens.append(")")
-    return tokens
-    # END case
-
-  # case 3: brackets
-  if s[0] == "(":
-    bracket_count = 1
-    end_index = 1
-    while end_index < len(s) and bracket_count != 0:
-      if s[end_index] == "(":
-        bracket_count += 1
-      if s[end_index] == ")":
-        bracket_count -= 1
-      end_index += 1
-    if bracket_count > 0:
-      # ERROR
-      error_component = "EOL."
-      if end_index < len(s) - 1:
-        error_component = s[end_index + 1] + "."
-      print(
-        "Error in [" + original + "] at position " + str(pos + end_index) +
-        ": Expected closing parenthesis, found " + error_component
-      )
-      return False
-    if end_index <= 2:
-      # ERROR
-      print(
-        "Error in [" + original + "] at position " + str(pos + 1) +
-        ": Missing tokens between brackets."
-      )
-      return False
-    # recursive call
-    nested_tokens = parse_tokens_rec(s[1:end_index - 1], original, pos + 1, association_type)
-    if not nested_tokens:
-      return False  # ERROR - message returned further down in recursive calls
-    # pre-subcase 3.1: bracket does not go up to the end of the string
-    if end_index + 1 < len(s) and association_type:
-      tokens.append("(")
-    # add tokens with brackets
-    tokens.append("(")
-    tokens.extend(nested_tokens)
-    tokens.append(")")
-    # subcase 3.1: more expression after bracket ends
-    if end_index < len(s):
-      # recursive call
-      additional_tokens = parse_tokens_rec(s[end_index:], original, pos + end_index, association_type)
-      if additional_tokens == False:
-        return False  # ERROR - message returned further down in recursive calls
-      tokens.extend(additional_tokens)
-    if end_index + 1 < len(s) and association_type:
-      tokens.append(")")
-    return tokens
-    # END case
-
-  # case 4: all other characters
-  if s[0] in var_chars:
-    if s[0] not in alphabet_chars:
-      # ERROR
-      print("Error in [" + original + "] at position " + str(pos + 1) + ": Name must start with a character.")
-      return False
-    end_index = 1
-    # find length of all characters that are tokens of the expression chain
-    while end_index < len(s) and s[end_index] in var_chars + [" "]:
-      end_index += 1
-    # split into char tokens to add associativity optionally, otherwise extend tokens list directly
-    char_tokens = s[:end_index].strip().split(" ")
-    if association_type:
-      # RESOLVE AMBIGUITY: add association
-      char_tokens = add_associativity(char_tokens, association_type)
-    tokens.extend(char_tokens)
-    # recursive call
-    additional_tokens = parse_tokens_rec(s[end_index:], original, pos + end_index, association_type)
-    if additional_tokens == False:
-      return False  # ERROR - message returned further down in recursive calls
-    tokens.extend(additional_tokens)
-    return tokens
-    # END case
-
-  # case 5: anything else unknown
-  else:
-    # ERROR
-    print("Error in [" + original + "] at position " + str(pos + 1) + ": Unexpected token '" + s[0] + "'")
-    return False
-    # END case
+  :param s: the input string
+  :param association_type: If not None, add brackets to make expressions non-ambiguous
+  :param report: If False, do not make error messages
+  :return: A tuple of the tokens (strings) if a valid input, otherwise False,
+  and the error messages
+  """
+  return parse_tokens_frozen(s, association_type, report)
 
 
-def parse_tokens(s_: str, association_type: Optional[str] = None) -> Union[List[str], bool]:
+def parse_tokens(s_: str, association_type: Optional[str] = None, memoize: bool = False,
+                 report: bool = True) -> Union[List[str], Literal[False]]:
   """
   Gets the final tokens for valid strings as a list of strings, only for valid syntax,
   where tokens are (no whitespace included)
@@ -276,27 +449,63 @@ def parse_tokens(s_: str, association_type: Optional[str] = None) -> Union[List[
   valid variable names
   opening and closing parenthesis
   Note that dots are replaced with corresponding parenthesis
+  In the case of a non-valid string, the corresponding error message is printed, unless report is False
 
   :param s_: the input string
   :param association_type: If not None, add brackets to make expressions non-ambiguous
+  :param memoize: If True, reuse the result of a previous parse of the same input
+  (warnings from add_associativity are then only printed the first time)
+  :param report: If False, do not make or print error messages, which is faster when only validity matters
   :return: A List of tokens (strings) if a valid input, otherwise False
   """
-  s = s_[:]
-  return parse_tokens_rec(s, s, 0, association_type)
+  tokens: Union[List[str], Literal[False]]
+  errors: Sequence[str]
+  if memoize:
+    cached_tokens, errors = parse_tokens_memo(s_, association_type, report)
+    tokens = False if cached_tokens is False else list(cached_tokens)
+  else:
+    tokens, errors = parse_tokens_quiet(s_, association_type, report)
+  if report:
+    for message in errors:
+      print(message)
+  return tokens
 
 
-def read_lines_from_txt_check_validity(fp: Union[str, os.PathLike]) -> None:
+def parse_lines(lines: List[str], parsed: Optional[Dict[str, ParseResult]] = None) -> List[ParseResult]:
+  """
+  Parses each distinct line once with parse_tokens_frozen(), spread over a pool of worker processes
+  when there are enough new lines and cores to make up for starting them
+  :param lines: The lines to parse
+  :param parsed: If not None, the results of lines parsed before, e.g. by another pass over the same file,
+  which is updated with the newly parsed lines
+  :return: The tokens (or False) and error messages of each line, in the order of lines
+  """
+  if parsed is None:
+    parsed = {}
+  new_lines = [l for l in dict.fromkeys(lines) if l not in parsed]
+  if len(new_lines) < _PARALLEL_MIN_LINES or (os.cpu_count() or 1) < 2:
+    results = [parse_tokens_frozen(l) for l in new_lines]
+  else:
+    with multiprocessing.Pool() as pool:
+      results = pool.map(parse_tokens_frozen, new_lines, chunksize=64)
+  parsed.update(zip(new_lines, results))
+  return [parsed[l] for l in lines]
+
+
+def read_lines_from_txt_check_validity(fp: Union[str, os.PathLike],
+                                        parsed: Optional[Dict[str, ParseResult]] = None) -> None:
   """
   Reads each line from a .txt file, and then
   parses each string  to yield a tokenized list of strings for printing, joined by _ characters
-  In the case of a non-valid line, the corresponding error message is printed (not necessarily within
-  this function, but possibly within the parse_tokens function).
+  In the case of a non-valid line, the corresponding error message is printed.
   :param lines: The file path of the lines to parse
+  :param parsed: If not None, results shared with other passes over the same file, see parse_lines()
   """
   lines = read_lines_from_txt(fp)
   valid_lines = []
-  for l in lines:
-    tokens = parse_tokens(l)
+  for l, (tokens, errors) in zip(lines, parse_lines(lines, parsed)):
+    for message in errors:
+      print(message)
     if tokens:
       valid_lines.append(l)
       print(f"The tokenized string for input string {l} is {'_'.join(tokens)}")
@@ -304,24 +513,59 @@ def read_lines_from_txt_check_validity(fp: Union[str, os.PathLike]) -> None:
     print(f"All lines are valid")
 
 
-def read_lines_from_txt_output_parse_tree(fp: Union[str, os.PathLike]) -> None:
+def read_lines_from_txt_output_parse_tree(fp: Union[str, os.PathLike],
+                                          parsed: Optional[Dict[str, ParseResult]] = None) -> None:
   """
   Reads each line from a .txt file, and then
   parses each string to yield a tokenized output string, to be used in constructing a parse tree. The
   parse tree should call print_tree() to print its content to the console.
-  In the case of a non-valid line, the corresponding error message is printed (not necessarily within
-  this function, but possibly within the parse_tokens function).
+  In the case of a non-valid line, the corresponding error message is printed.
   :param fp: The file path of the lines to parse
+  :param parsed: If not None, results shared with other passes over the same file, see parse_lines()
   """
   lines = read_lines_from_txt(fp)
-  for l in lines:
-    tokens = parse_tokens(l)
+  for tokens, errors in parse_lines(lines, parsed):
+    for message in errors:
+      print(message)
     if tokens:
       print("\n")
-      parse_tree2 = build_parse_tree(tokens)
+      parse_tree2 = build_parse_tree(list(tokens))
       parse_tree2.print_tree()
 
 
+def associate_left(s_: List[str]) -> List[str]:
+  """
+  :param s_: A list of string tokens
+  :return: List of strings, with added parenthesis grouping the tokens from the left: ((a b) c)
+  """
+
+  if len(s_) <= 1:  # nothing to group
+    return list(s_)
+  grouped = ["("] * (len(s_) - 1)
+  grouped.append(s_[0])
+  for token in s_[1:]:
+    grouped.append(token)
+    grouped.append(")")
+  return grouped
+
+
+def associate_right(s_: List[str]) -> List[str]:
+  """
+  :param s_: A list of string tokens
+  :return: List of strings, with added parenthesis grouping the tokens from the right: (a (b c))
+  """
+
+  if len(s_) <= 1:  # nothing to group
+    return list(s_)
+  grouped = []
+  for token in s_[:-1]:
+    grouped.append("(")
+    grouped.append(token)
+  grouped.append(s_[-1])
+  grouped.extend([")"] * (len(s_) - 1))
+  return grouped
+
+
 def add_associativity(s_: List[str], association_type: str = "left") -> List[str]:
   """
   :param s_: A list of string tokens
@@ -329,61 +573,85 @@ def add_associativity(s_: List[str], association_type: str = "left") -> List[str
   :return: List of strings, with added parenthesis that disambiguates the original expression
   """
 
-  s = s_[:]  # Don't modify original string
-
-  if len(s) <= 1:  # base case
-    return s
+  if len(s_) <= 1:  # nothing to group
+    return list(s_)
   if association_type == "left":  # ((a b) c)
-    group = add_associativity(s[:-1], association_type)
-    return ["("] + group + [s[-1]] + [")"]
+    return associate_left(s_)
   elif association_type == "right":  # (a (b c))
-    group = add_associativity(s[1:], association_type)
-    return ["("] + [s[0]] + group + [")"]
+    return associate_right(s_)
   else:  # invalid type
     print("Warning: unknown association type: " + association_type + " , using default grouping")
-    return s
+    return list(s_)
+
 
+def get_associator(association_type: Optional[str]) -> Optional[Associator]:
+  """
+  Resolves the association type once per parse, so that parse_tokens_rec does not compare it on every token
+  :param association_type: If not None, a string in [`left`, `right`]
+  :return: The function adding association brackets to a list of tokens, or None for no association
+  """
+
+  if not association_type:
+    return None
+  if association_type == "left":
+    return associate_left
+  if association_type == "right":
+    return associate_right
+  # unknown type, add_associativity warns on every use and keeps the default grouping
+  return functools.partial(add_associativity, association_type=association_type)
 
-def build_parse_tree_rec(tokens: List[str], node: Optional[Node] = None) -> Node:
+
+def build_parse_tree_rec(tokens: List[str], node: Optional[Node] = None, start: int = 0,
+                         end: Optional[int] = None, match: Optional[List[int]] = None) -> Node:
   """
   An inner recursive inner function to build a parse tree
   :param tokens: A list of token strings
   :param node: A Node object
+  :param start: index of the first token of the subtree
+  :param end: index after the last token of the subtree, defaults to the end of tokens
+  :param match: index of the matching closing bracket for each opening bracket in tokens,
+  computed once by the outermost call
   :return: a node with children whose tokens are variables, parenthesis, slashes, or the inner part of an expression
   """
 
+  if end is None:
+    end = len(tokens)
+  if match is None:
+    # pair up brackets once, unclosed brackets run to the end of tokens
+    match = [end] * len(tokens)
+    open_brackets: List[int] = []
+    for j in range(start, end):
+      if tokens[j] == '(':
+        open_brackets.append(j)
+      elif tokens[j] == ')' and open_brackets:
+        match[open_brackets.pop()] = j
   if node is None:
-    node = Node(["_".join(tokens)])  # initial node
-  i = 0
-  while i < len(tokens):
+    node = Node(["_".join(tokens[start:end])])  # initial node
+  add_child = node.add_child_node
+  i = start
+  while i < end:
     token = tokens[i]
     if token == '(':
-      # token subtree
-      subtree_tokens = []
-      node.add_child_node(Node(['(']))
-      paren_count = 1
-      i += 1
-      while i < len(tokens) and paren_count > 0:
-        if tokens[i] == '(':
-          paren_count += 1
-        elif tokens[i] == ')':
-          paren_count -= 1
-        if paren_count > 0:
-          subtree_tokens.append(tokens[i])
-        i += 1
+      add_child(Node(['(']))
+      # token subtree, up to the matching bracket
+      j = match[i]
       # recursive call
-      subtree = build_parse_tree_rec(subtree_tokens)
-      node.add_child_node(subtree)
-      node.add_child_node(Node([')']))
+      subtree = build_parse_tree_rec(tokens, None, i + 1, j, match)
+      add_child(subtree)
+      add_child(Node([')']))
+      i = j + 1
     elif token == '\\':
       i += 1
+      if i >= end:
+        # the variable must be inside this subtree, not the parent's closing bracket
+        raise IndexError("list index out of range")
       var_token = tokens[i]
-      lambda_node = Node([f"\\", var_token])
-      node.add_child_node(lambda_node)
+      lambda_node = Node(["\\", var_token])
+      add_child(lambda_node)
       i += 1
     else:
       var_node = Node([token])
-      node.add_child_node(var_node)
+      add_child(var_node)
       i += 1
   return node
 
@@ -400,15 +668,18 @@ def build_parse_tree(tokens: List[str]) -> ParseTree:
 
 if __name__ == "__main__":
   print("\n\nChecking valid examples...")
-  read_lines_from_txt_check_validity(valid_examples_fp)
-  read_lines_from_txt_output_parse_tree(valid_examples_fp)
+  # both passes over a file share its parsed lines
+  parsed_valid: Dict[str, ParseResult] = {}
+  read_lines_from_txt_check_validity(valid_examples_fp, parsed_valid)
+  read_lines_from_txt_output_parse_tree(valid_examples_fp, parsed_valid)
 
   print("\n\nChecking invalid examples...")
   read_lines_from_txt_check_validity(invalid_examples_fp)
 
   print("\n\nChecking extra valid examples...")
-  read_lines_from_txt_check_validity(extra_valid_examples_fp)
-  read_lines_from_txt_output_parse_tree(extra_valid_examples_fp)
+  parsed_extra_valid: Dict[str, ParseResult] = {}
+  read_lines_from_txt_check_validity(extra_valid_examples_fp, parsed_extra_valid)
+  read_lines_from_txt_output_parse_tree(extra_valid_examples_fp, parsed_extra_valid)
 
   print("\n\nChecking extra invalid examples...")
   read_lines_from_txt_check_validity(extra_invalid_examples_fp)
@@ -435,5 +706,6 @@ if __name__ == "__main__":
   # Additional test for parse tree
   print("\n\nAdditional parse tree test for demo")
   tokens = parse_tokens("\\x.\\y (x y b c)")
-  parse_tree2 = build_parse_tree(tokens)
-  parse_tree2.print_tree()
+  if tokens:
+    parse_tree2 = build_parse_tree(tokens)
+    parse_tree2.print_tree()